@@ -4,12 +4,99 @@ Lint and fix manifest JSON files to prevent parsing errors.
 This script detects and fixes common JSON issues that can cause validation failures.
 """
 
+import io
 import json
 import os
 import sys
 import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Dict, Iterator, List, Tuple, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Invisible Unicode characters that can break JSON parsing
+_INVISIBLE_CHAR_NAMES = {
+    '\u200b': 'zero-width space',
+    '\u200c': 'zero-width non-joiner',
+    '\u200d': 'zero-width joiner',
+    '\ufeff': 'byte order mark',
+    '\u202a': 'left-to-right embedding',
+    '\u202b': 'right-to-left embedding',
+    '\u202c': 'pop directional formatting',
+    '\u202d': 'left-to-right override',
+    '\u202e': 'right-to-left override',
+    '\xa0': 'non-breaking space'
+}
+
+# Single-pass scanners for the characters above; non-breaking spaces are
+# replaced rather than removed, so they are left out of the removal pattern
+_INVISIBLE_RE = re.compile('[\u200b-\u200d\ufeff\u202a-\u202e\xa0]')
+_REMOVABLE_RE = re.compile('[\u200b-\u200d\ufeff\u202a-\u202e]')
+
+_BRACE_RE = re.compile(r'[{}]')
+_TRAILING_COMMA_RE = re.compile(r',(\s*[}\]])')
+_CRLF_RE = re.compile(r'\r\n?')
+_JSON_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+
+_JSON_DECODER = json.JSONDecoder()
+
+# Below this many files the process pool costs more to start than it saves
+PARALLEL_MIN_FILES = 16
+
+def _find_json_end(content: str) -> int:
+    """Return the index of the brace that closes the top-level object, or -1."""
+    # raw_decode parses the leading JSON value in C and reports where it
+    # stopped, so anything after that is trailing content
+    start = _JSON_WHITESPACE_RE.match(content).end()
+    try:
+        _, end = _JSON_DECODER.raw_decode(content, start)
+        return end - 1
+    except ValueError:
+        pass
+    
+    # The leading value does not parse, so fall back to visiting only the
+    # braces themselves rather than every character
+    brace_count = 0
+    for match in _BRACE_RE.finditer(content):
+        if match.group() == '{':
+            brace_count += 1
+        else:
+            brace_count -= 1
+            if brace_count == 0:
+                return match.start()
+    return -1
+
+def _json_loads(content: str) -> Any:
+    """Parse JSON with orjson when available, falling back to the json module."""
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Re-parse below so errors keep the json module's wording and
+            # anything json accepts but orjson rejects (NaN, huge ints) passes
+            pass
+    return json.loads(content)
+
+def _walk_manifest_files(directory: Path) -> Iterator[str]:
+    """Yield the path of every manifest JSON file below directory, skipping index.json."""
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith('.json') and name != 'index.json':
+                yield os.path.join(root, name)
+
+def lint_one(filepath: str, fix: bool = False) -> Tuple[str, List[str], List[str], bool, str]:
+    """Lint a single file in isolation, returning its results and captured output."""
+    linter = ManifestLinter(fix=fix)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        valid = linter.lint_file(filepath)
+    return filepath, linter.errors_found, linter.fixes_applied, valid, output.getvalue()
 
 class ManifestLinter:
     def __init__(self, fix: bool = False):
@@ -20,68 +107,38 @@ class ManifestLinter:
     def detect_invisible_chars(self, content: str, filename: str) -> List[Tuple[int, str]]:
         """Detect invisible Unicode characters that can break JSON parsing."""
         issues = []
-        invisible_chars = {
-            '\u200b': 'zero-width space',
-            '\u200c': 'zero-width non-joiner',
-            '\u200d': 'zero-width joiner',
-            '\ufeff': 'byte order mark',
-            '\u202a': 'left-to-right embedding',
-            '\u202b': 'right-to-left embedding',
-            '\u202c': 'pop directional formatting',
-            '\u202d': 'left-to-right override',
-            '\u202e': 'right-to-left override',
-            '\xa0': 'non-breaking space'
-        }
-        
-        for char, name in invisible_chars.items():
-            positions = [i for i, c in enumerate(content) if c == char]
-            for pos in positions:
-                issues.append((pos, f"Found {name} at position {pos}"))
+        for match in _INVISIBLE_RE.finditer(content):
+            pos = match.start()
+            name = _INVISIBLE_CHAR_NAMES[match.group()]
+            issues.append((pos, f"Found {name} at position {pos}"))
                 
         return issues
     
     def check_trailing_content(self, content: str) -> Optional[int]:
         """Check for content after the final closing brace."""
-        # Find the last closing brace
-        brace_count = 0
-        last_closing_pos = -1
-        
-        for i, char in enumerate(content):
-            if char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    last_closing_pos = i
-                    
-        if last_closing_pos != -1:
-            # Check if there's any non-whitespace after the last closing brace
-            remaining = content[last_closing_pos + 1:].strip()
+        end = _find_json_end(content)
+        if end != -1:
+            # Check if there's any non-whitespace after the closing brace
+            remaining = content[end + 1:].strip()
             if remaining:
-                return last_closing_pos + 1
+                return end + 1
                 
         return None
     
-    def validate_json_structure(self, content: str) -> Tuple[bool, Optional[str]]:
-        """Validate JSON structure and return detailed error info."""
+    def parse_json(self, content: str) -> Tuple[Any, Optional[str]]:
+        """Parse JSON, returning the decoded data or detailed error info."""
         try:
-            json.loads(content)
-            return True, None
+            return _json_loads(content), None
         except json.JSONDecodeError as e:
-            return False, f"JSON error at line {e.lineno}, column {e.colno}: {e.msg}"
+            return None, f"JSON error at line {e.lineno}, column {e.colno}: {e.msg}"
     
     def fix_common_issues(self, content: str) -> str:
         """Fix common JSON issues."""
-        original = content
-        
         # Remove invisible Unicode characters
-        invisible_chars = [
-            '\u200b', '\u200c', '\u200d', '\ufeff', 
-            '\u202a', '\u202b', '\u202c', '\u202d', '\u202e'
-        ]
-        for char in invisible_chars:
-            if char in content:
-                content = content.replace(char, '')
+        found = set(_REMOVABLE_RE.findall(content))
+        if found:
+            content = _REMOVABLE_RE.sub('', content)
+            for char in sorted(found):
                 self.fixes_applied.append(f"Removed invisible character: {repr(char)}")
         
         # Replace non-breaking spaces with regular spaces
@@ -90,37 +147,32 @@ class ManifestLinter:
             self.fixes_applied.append("Replaced non-breaking spaces")
         
         # Remove trailing commas before closing braces/brackets
-        content = re.sub(r',(\s*[}\]])', r'\1', content)
-        if content != original:
+        content, removed = _TRAILING_COMMA_RE.subn(r'\1', content)
+        if removed:
             self.fixes_applied.append("Removed trailing commas")
         
         # Ensure proper line endings
-        content = content.replace('\r\n', '\n').replace('\r', '\n')
+        if '\r' in content:
+            content = _CRLF_RE.sub('\n', content)
         
         # Remove any content after the final closing brace
-        brace_count = 0
-        for i, char in enumerate(content):
-            if char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    # Found the final closing brace
-                    remaining = content[i + 1:].strip()
-                    if remaining:
-                        content = content[:i + 1] + '\n'
-                        self.fixes_applied.append(f"Removed trailing content: {repr(remaining[:50])}")
-                    break
+        end = _find_json_end(content)
+        if end != -1:
+            remaining = content[end + 1:].strip()
+            if remaining:
+                content = content[:end + 1] + '\n'
+                self.fixes_applied.append(f"Removed trailing content: {repr(remaining[:50])}")
         
         return content
     
-    def lint_file(self, filepath: Path) -> bool:
+    def lint_file(self, filepath: str) -> bool:
         """Lint a single manifest file."""
         print(f"\nChecking: {filepath}")
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
+            # Read the raw bytes in one call and decode them once
+            with open(filepath, 'rb') as f:
+                content = f.read().decode('utf-8')
                 
             # Check for invisible characters
             invisible = self.detect_invisible_chars(content, str(filepath))
@@ -129,15 +181,23 @@ class ManifestLinter:
                     self.errors_found.append(f"{filepath}: {msg}")
                     print(f"  ⚠️  {msg}")
             
-            # Check for trailing content
-            trailing_pos = self.check_trailing_content(content)
+            # Validate JSON structure
+            _, error = self.parse_json(content)
+            valid = error is None
+            
+            # Check for trailing content; a document that parses cannot have
+            # any, so only invalid ones need the extra scan
+            trailing_pos = None if valid else self.check_trailing_content(content)
             if trailing_pos is not None:
                 msg = f"Non-whitespace content after JSON at position {trailing_pos}"
                 self.errors_found.append(f"{filepath}: {msg}")
                 print(f"  ⚠️  {msg}")
             
-            # Validate JSON structure
-            valid, error = self.validate_json_structure(content)
+            if valid and not invisible and trailing_pos is None:
+                # Fast path: a clean file needs no second parse or rewrite
+                print(f"  ✅ Valid JSON")
+                return True
+            
             if not valid:
                 self.errors_found.append(f"{filepath}: {error}")
                 print(f"  ❌ {error}")
@@ -145,11 +205,10 @@ class ManifestLinter:
                 if self.fix:
                     # Try to fix common issues
                     fixed_content = self.fix_common_issues(content)
-                    valid, _ = self.validate_json_structure(fixed_content)
+                    data, fix_error = self.parse_json(fixed_content)
                     
-                    if valid:
-                        # Also format the JSON nicely
-                        data = json.loads(fixed_content)
+                    if fix_error is None:
+                        # Also format the JSON nicely, reusing the parsed data
                         fixed_content = json.dumps(data, indent=4, ensure_ascii=False)
                         
                         with open(filepath, 'w', encoding='utf-8') as f:
@@ -161,9 +220,9 @@ class ManifestLinter:
                         return False
             else:
                 # Even if valid, apply fixes if requested
-                if self.fix and (invisible or trailing_pos):
+                if self.fix:
                     fixed_content = self.fix_common_issues(content)
-                    data = json.loads(fixed_content)
+                    data = _json_loads(fixed_content)
                     fixed_content = json.dumps(data, indent=4, ensure_ascii=False)
                     
                     with open(filepath, 'w', encoding='utf-8') as f:
@@ -181,10 +240,7 @@ class ManifestLinter:
     
     def lint_directory(self, directory: Path) -> bool:
         """Lint all manifest files in a directory."""
-        manifest_files = list(directory.rglob("*.json"))
-        
-        # Exclude index.json files
-        manifest_files = [f for f in manifest_files if f.name != 'index.json']
+        manifest_files = list(_walk_manifest_files(directory))
         
         if not manifest_files:
             print("No manifest files found")
@@ -193,9 +249,22 @@ class ManifestLinter:
         print(f"Found {len(manifest_files)} manifest files")
         
         all_valid = True
-        for filepath in manifest_files:
-            if not self.lint_file(filepath):
-                all_valid = False
+        if len(manifest_files) < PARALLEL_MIN_FILES:
+            for filepath in manifest_files:
+                if not self.lint_file(filepath):
+                    all_valid = False
+            return all_valid
+        
+        # Files are independent, so lint them across all cores and merge the
+        # results back in order
+        with ProcessPoolExecutor() as executor:
+            results = executor.map(partial(lint_one, fix=self.fix), manifest_files, chunksize=8)
+            for _, errors, fixes, valid, output in results:
+                sys.stdout.write(output)
+                self.errors_found.extend(errors)
+                self.fixes_applied.extend(fixes)
+                if not valid:
+                    all_valid = False
         
         return all_valid
 
@@ -226,7 +295,7 @@ def main():
     path = Path(args.path)
     
     if path.is_file():
-        success = linter.lint_file(path)
+        success = linter.lint_file(str(path))
     elif path.is_dir():
         success = linter.lint_directory(path)
     else:
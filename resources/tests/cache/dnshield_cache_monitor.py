@@ -1,24 +1,57 @@
 #!/usr/bin/env python3
 """
 DNShield Cache Monitor - Test DNS caching behavior for specific domains
+
+Queries are sent directly over UDP with dnspython when it is installed;
+otherwise each query falls back to running dig.
 """
+import asyncio
+import bisect
+import functools
+import plistlib
+import socket
 import subprocess
 import time
 import json
 import sys
-import statistics
+from contextlib import contextmanager
 from datetime import datetime
 
-def query_dns(domain, query_type='A', server='127.0.0.1', port=53):
+try:
+    import dns.asyncquery
+    import dns.exception
+    import dns.inet
+    import dns.message
+    import dns.query
+    import dns.rcode
+except ImportError:
+    dns = None
+
+@contextmanager
+def query_socket(server='127.0.0.1'):
+    """Yield a UDP socket to reuse across queries, or None when dnspython is unavailable"""
+    if dns is None:
+        yield None
+        return
+    sock = socket.socket(dns.inet.af_for_address(server), socket.SOCK_DGRAM)
+    sock.setblocking(False)  # dnspython requires a non-blocking socket
+    try:
+        yield sock
+    finally:
+        sock.close()
+
+def query_dns(domain, query_type='A', server='127.0.0.1', port=53, sock=None):
     """Query DNS and return response time in milliseconds"""
-    start = time.time()
+    if dns is not None:
+        return _query_dns_udp(domain, query_type, server, port, sock)
+
+    start = time.perf_counter_ns()
     try:
         result = subprocess.run(
             ['dig', '+short', f'@{server}', '-p', str(port), domain, query_type],
             capture_output=True, text=True, timeout=5
         )
-        end = time.time()
-        response_time = (end - start) * 1000  # Convert to milliseconds
+        response_time = (time.perf_counter_ns() - start) / 1e6  # Convert to milliseconds
         return {
             'time_ms': response_time,
             'result': result.stdout.strip(),
@@ -27,29 +60,158 @@ def query_dns(domain, query_type='A', server='127.0.0.1', port=53):
     except subprocess.TimeoutExpired:
         return {'time_ms': 5000, 'result': None, 'error': 'Timeout'}
 
+def _query_dns_udp(domain, query_type, server, port, sock):
+    """Send a single query with dnspython, without forking a dig process"""
+    start = time.perf_counter_ns()
+    try:
+        # A malformed name or type raises here, so it is reported like any
+        # other query error; the clock restarts to time only the round trip
+        query = dns.message.make_query(domain, query_type)
+        start = time.perf_counter_ns()
+        response = dns.query.udp(query, server, port=port, timeout=5, sock=sock)
+    except dns.exception.Timeout:
+        return {'time_ms': 5000, 'result': None, 'error': 'Timeout'}
+    except dns.exception.DNSException as e:
+        return {'time_ms': (time.perf_counter_ns() - start) / 1e6, 'result': None, 'error': str(e)}
+    return _response_result(response, (time.perf_counter_ns() - start) / 1e6)
+
+async def _query_dns_async(domain, query_type, server, port):
+    """Send a single query with dnspython's asyncio API, timing it on its own"""
+    start = time.perf_counter_ns()
+    try:
+        query = dns.message.make_query(domain, query_type)
+        start = time.perf_counter_ns()
+        response = await dns.asyncquery.udp(query, server, port=port, timeout=5)
+    except dns.exception.Timeout:
+        return {'time_ms': 5000, 'result': None, 'error': 'Timeout'}
+    except dns.exception.DNSException as e:
+        return {'time_ms': (time.perf_counter_ns() - start) / 1e6, 'result': None, 'error': str(e)}
+    return _response_result(response, (time.perf_counter_ns() - start) / 1e6)
+
+def _response_result(response, response_time):
+    """Convert a dnspython response into the same dict the dig path returns"""
+    # Match dig +short: one record per line, answer section only
+    answers = [rdata.to_text() for rrset in response.answer for rdata in rrset]
+    rcode = response.rcode()
+    return {
+        'time_ms': response_time,
+        'result': '\n'.join(answers),
+        'error': dns.rcode.to_text(rcode) if rcode != dns.rcode.NOERROR else None
+    }
+
+@functools.lru_cache(maxsize=1)
+def _read_preferences():
+    """Export the com.dnshield.app preference domain once and cache the result"""
+    result = subprocess.run(
+        ['defaults', 'export', 'com.dnshield.app', '-'],
+        capture_output=True
+    )
+    if result.returncode != 0:
+        return {}
+    return plistlib.loads(result.stdout)
+
+@functools.lru_cache(maxsize=1)
+def _read_cache_rules():
+    """Return DomainCacheRules as exact-match rules and wildcard suffix rules"""
+    rules = _read_preferences().get('DomainCacheRules', {})
+    exact = {}
+    wildcards = []
+    for pattern, rule in rules.items():
+        # Rules written as strings (e.g. defaults write ... -dict with JSON
+        # text) are not dictionaries and cannot be applied
+        if not isinstance(rule, dict):
+            continue
+        exact[pattern] = rule
+        if pattern.startswith('*.'):
+            wildcards.append((pattern[2:], rule))
+        elif pattern.startswith('*'):
+            wildcards.append((pattern[1:], rule))
+    return exact, wildcards
+
+def _reload_preferences():
+    """Drop cached preferences after writing to the domain"""
+    _read_preferences.cache_clear()
+    _read_cache_rules.cache_clear()
+
+def _format_default(value):
+    """Format a preference value the way 'defaults read' prints it"""
+    if isinstance(value, bool):
+        return str(int(value))
+    return str(value)
+
 def get_cache_rule(domain):
     """Get cache rule for a specific domain pattern"""
     try:
-        result = subprocess.run(
-            ['defaults', 'read', 'com.dnshield.app', 'DomainCacheRules'],
-            capture_output=True, text=True
-        )
-        if result.returncode == 0:
-            # Parse the output to find matching rules
-            lines = result.stdout.strip().split('\n')
-            for i, line in enumerate(lines):
-                if domain in line or f"*.{domain.split('.', 1)[-1]}" in line:
-                    # Found a potential match, extract the rule
-                    rule_info = {}
-                    for j in range(i, min(i+5, len(lines))):
-                        if 'action' in lines[j]:
-                            rule_info['action'] = lines[j].split('=')[1].strip(' ";')
-                        elif 'ttl' in lines[j]:
-                            rule_info['ttl'] = int(lines[j].split('=')[1].strip(' ;'))
-                    return rule_info
-    except:
-        pass
-    return None
+        rules = _read_cache_rules()
+    except Exception:
+        return None
+
+    # Match the way findMatchingCacheRule in the extension does: an exact
+    # key first, then wildcard patterns as plain case-sensitive suffixes
+    # ("*.okta.com" also matches "okta.com" and "notokta.com")
+    exact, wildcards = rules
+    rule = exact.get(domain)
+    if rule is None:
+        for suffix, candidate in wildcards:
+            if domain.endswith(suffix):
+                rule = candidate
+                break
+    return dict(rule) if rule is not None else None
+
+class LatencyStats:
+    """Response time statistics accumulated as each sample arrives"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = []  # kept sorted, so min/max/median need no extra pass
+
+    def add(self, time_ms):
+        self.count += 1
+        self.total += time_ms
+        bisect.insort(self.samples, time_ms)
+
+    @property
+    def min(self):
+        return self.samples[0]
+
+    @property
+    def max(self):
+        return self.samples[-1]
+
+    @property
+    def mean(self):
+        return self.total / self.count
+
+    @property
+    def median(self):
+        mid = self.count // 2
+        if self.count % 2:
+            return self.samples[mid]
+        return (self.samples[mid - 1] + self.samples[mid]) / 2
+
+    def percentile(self, pct):
+        """Linearly interpolated percentile, matching numpy's default method"""
+        rank = (self.count - 1) * pct / 100
+        lower = int(rank)
+        upper = min(lower + 1, self.count - 1)
+        return self.samples[lower] + (self.samples[upper] - self.samples[lower]) * (rank - lower)
+
+    def count_below(self, time_ms):
+        """Number of samples faster than time_ms, found by bisecting the sorted samples"""
+        return bisect.bisect_left(self.samples, time_ms)
+
+def print_statistics(stats, show_cached=True):
+    """Print min/max/average/median response times"""
+    print(f"\nStatistics:")
+    print(f"  Min time: {stats.min:.2f}ms")
+    print(f"  Max time: {stats.max:.2f}ms")
+    print(f"  Avg time: {stats.mean:.2f}ms")
+    print(f"  Median:   {stats.median:.2f}ms")
+    print(f"  P95:      {stats.percentile(95):.2f}ms")
+    print(f"  P99:      {stats.percentile(99):.2f}ms")
+    if show_cached:
+        print(f"  Cached:   {stats.count_below(5)}/{stats.count} under 5ms")
 
 def test_domain_cache(domain, iterations=10, delay=0.1):
     """Test caching behavior for a specific domain"""
@@ -57,19 +219,15 @@ def test_domain_cache(domain, iterations=10, delay=0.1):
     print("=" * 50)
     
     # Check cache settings
-    managed_result = subprocess.run(
-        ['defaults', 'read', 'com.dnshield.app', 'EnableDNSCache'],
-        capture_output=True, text=True
-    )
+    try:
+        preferences = _read_preferences()
+    except Exception:
+        preferences = {}
 
-    if managed_result.returncode == 0:
-        cache_enabled = f"{managed_result.stdout.strip()} (managed)"
+    if 'EnableDNSCache' in preferences:
+        cache_enabled = f"{_format_default(preferences['EnableDNSCache'])} (managed)"
     else:
-        user_result = subprocess.run(
-            ['defaults', 'read', 'com.dnshield.app', 'UserCanAdjustCache'],
-            capture_output=True, text=True
-        )
-        cache_enabled = user_result.stdout.strip() if user_result.returncode == 0 else "0"
+        cache_enabled = _format_default(preferences.get('UserCanAdjustCache', 0))
 
     print(f"Cache Enabled: {cache_enabled}")
     
@@ -81,39 +239,78 @@ def test_domain_cache(domain, iterations=10, delay=0.1):
         print("Cache Rule: Default (300s TTL)")
     
     # Perform queries
-    times = []
+    stats = LatencyStats()
+    first_query = None
+    subsequent_max = 0.0
     print(f"\nPerforming {iterations} queries with {delay}s delay...")
     
-    for i in range(iterations):
-        result = query_dns(domain)
-        times.append(result['time_ms'])
-        
-        status = "✓" if result['result'] else "✗"
-        cache_indicator = "CACHED" if result['time_ms'] < 5 else "FRESH"
-        
-        print(f"Query {i+1:2d}: {result['time_ms']:6.2f}ms [{cache_indicator}] {status}")
-        
-        if i < iterations - 1:
-            time.sleep(delay)
+    with query_socket() as sock:
+        for i in range(iterations):
+            result = query_dns(domain, sock=sock)
+            stats.add(result['time_ms'])
+            if first_query is None:
+                first_query = result['time_ms']
+            else:
+                subsequent_max = max(subsequent_max, result['time_ms'])
+            
+            status = "✓" if result['result'] else "✗"
+            cache_indicator = "CACHED" if result['time_ms'] < 5 else "FRESH"
+            
+            print(f"Query {i+1:2d}: {result['time_ms']:6.2f}ms [{cache_indicator}] {status}")
+            
+            if i < iterations - 1:
+                time.sleep(delay)
     
     # Analyze results
-    print(f"\nStatistics:")
-    print(f"  Min time: {min(times):.2f}ms")
-    print(f"  Max time: {max(times):.2f}ms")
-    print(f"  Avg time: {statistics.mean(times):.2f}ms")
-    print(f"  Median:   {statistics.median(times):.2f}ms")
+    print_statistics(stats)
     
     # Detect caching
-    if len(times) > 1:
-        first_query = times[0]
-        subsequent = times[1:]
-        if all(t < first_query * 0.5 for t in subsequent):
+    if stats.count > 1:
+        if subsequent_max < first_query * 0.5:
             print("\n✓ Caching appears to be working!")
-        elif all(t > 10 for t in times):
+        elif stats.min > 10:
             print("\n✗ No caching detected - all queries appear fresh")
         else:
             print("\n? Inconsistent caching behavior detected")
 
+def flood_test(domain, queries=50, server='127.0.0.1', port=53):
+    """Prime the cache, then send a burst of concurrent queries against it"""
+    print(f"\nFlood testing DNS cache for: {domain}")
+    print("=" * 50)
+    
+    if dns is None:
+        print("Flood test requires dnspython (pip3 install dnspython)")
+        return
+    
+    # Prime the cache so the burst measures cache hits rather than racing
+    # the upstream lookup
+    initial = query_dns(domain, server=server, port=port)
+    print(f"Initial query: {initial['time_ms']:.2f}ms")
+    
+    async def burst():
+        return await asyncio.gather(
+            *[_query_dns_async(domain, 'A', server, port) for _ in range(queries)]
+        )
+    
+    print(f"\nSending {queries} concurrent queries...")
+    start = time.perf_counter_ns()
+    results = asyncio.run(burst())
+    wall_ms = (time.perf_counter_ns() - start) / 1e6
+    
+    stats = LatencyStats()
+    failed = 0
+    for r in results:
+        stats.add(r['time_ms'])
+        if not r['result']:
+            failed += 1
+    
+    print(f"Completed in {wall_ms:.2f}ms wall time")
+    print(f"Answered: {queries - failed}/{queries}")
+    
+    # Latency under load is not comparable to the sequential 5ms threshold
+    print("\nPer-query times below include queuing behind the other concurrent queries")
+    print_statistics(stats, show_cached=False)
+
 def monitor_cache_ttl(domain, expected_ttl=300, test_duration=None):
     """Monitor cache behavior over time to verify TTL"""
     if test_duration is None:
@@ -123,32 +320,40 @@ def monitor_cache_ttl(domain, expected_ttl=300, test_duration=None):
     print(f"Expected TTL: {expected_ttl}s, Test duration: {test_duration}s")
     print("=" * 50)
     
-    start_time = time.time()
-    query_count = 0
-    cache_hits = 0
+    # A fresh answer inside this window is treated as the cache expiring
+    expiry_start, expiry_end = expected_ttl - 5, expected_ttl + 5
     
-    # Initial query to populate cache
-    initial = query_dns(domain)
-    print(f"Initial query: {initial['time_ms']:.2f}ms")
+    start_ns = time.perf_counter_ns()
+    stats = LatencyStats()
+    cache_hits = 0
     
-    while time.time() - start_time < test_duration:
-        elapsed = time.time() - start_time
-        result = query_dns(domain)
-        query_count += 1
-        
-        if result['time_ms'] < 5:  # Likely cached
-            cache_hits += 1
-            status = "CACHED"
-        else:
-            status = "FRESH"
-            if elapsed > expected_ttl - 5 and elapsed < expected_ttl + 5:
-                print(f"\n>>> Cache expired at ~{elapsed:.0f}s (expected: {expected_ttl}s)")
-        
-        print(f"[{elapsed:6.1f}s] {result['time_ms']:6.2f}ms - {status}")
+    with query_socket() as sock:
+        # Initial query to populate cache
+        initial = query_dns(domain, sock=sock)
+        print(f"Initial query: {initial['time_ms']:.2f}ms")
         
-        time.sleep(10)  # Check every 10 seconds
+        while True:
+            elapsed = (time.perf_counter_ns() - start_ns) / 1e9
+            if elapsed >= test_duration:
+                break
+            result = query_dns(domain, sock=sock)
+            stats.add(result['time_ms'])
+            
+            if result['time_ms'] < 5:  # Likely cached
+                cache_hits += 1
+                status = "CACHED"
+            else:
+                status = "FRESH"
+                if expiry_start < elapsed < expiry_end:
+                    print(f"\n>>> Cache expired at ~{elapsed:.0f}s (expected: {expected_ttl}s)")
+            
+            print(f"[{elapsed:6.1f}s] {result['time_ms']:6.2f}ms - {status}")
+            
+            time.sleep(10)  # Check every 10 seconds
     
-    print(f"\nSummary: {cache_hits}/{query_count} queries were cached")
+    if stats.count:
+        print_statistics(stats)
+    print(f"\nSummary: {cache_hits}/{stats.count} queries were cached")
 
 def main():
     if len(sys.argv) < 2:
@@ -157,9 +362,11 @@ def main():
         print("  test     - Quick cache test (default)")
         print("  ttl      - Monitor TTL expiration")
         print("  compare  - Compare cached vs uncached performance")
+        print("  flood    - Send concurrent queries to stress the cache")
         print("\nExamples:")
         print("  python3 dnshield_cache_monitor.py github.com")
         print("  python3 dnshield_cache_monitor.py okta.com ttl")
+        print("  python3 dnshield_cache_monitor.py github.com flood")
         return
     
     domain = sys.argv[1]
@@ -172,6 +379,8 @@ def main():
         rule = get_cache_rule(domain)
         ttl = rule.get('ttl', 300) if rule else 300
         monitor_cache_ttl(domain, ttl)
+    elif command == 'flood':
+        flood_test(domain)
     elif command == 'compare':
         print("Testing with cache enabled...")
         test_domain_cache(domain, iterations=5)
@@ -179,6 +388,7 @@ def main():
         print("\n" + "="*50)
         print("Disabling cache for comparison...")
         subprocess.run(['defaults', 'write', 'com.dnshield.app', 'UserCanAdjustCache', '-bool', 'NO'])
+        _reload_preferences()
         time.sleep(2)
         
         test_domain_cache(domain, iterations=5)
@@ -186,6 +396,7 @@ def main():
         # Re-enable if it was enabled before
         print("\nRe-enabling cache...")
         subprocess.run(['defaults', 'write', 'com.dnshield.app', 'UserCanAdjustCache', '-bool', 'YES'])
+        _reload_preferences()
 
 if __name__ == '__main__':
     main()